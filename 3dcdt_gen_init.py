@@ -3,15 +3,12 @@
 # parameters: g T outfile
 
 import sys
-import gc
+import functools
 import numpy as np
-import pylab as pl  # Unused; likely for debugging
-import math as m    # Unused; possibly vestigial
-import time         # Unused; possibly for profiling
-import random       # Unused; possibly vestigial
-import itertools    # Unused; possibly vestigial
-import re           # Unused; possibly vestigial
-import fileinput    # Unused; possibly vestigial
+try:
+    from _cdt_core import gen_inner  # Optional Cython kernel, build with: cythonize -i _cdt_core.pyx
+except ImportError:
+    gen_inner = None
 
 # Comment: Script generates initial 3D CDT triangulation with genus g and T time slices, output to outfile (Sec. 3.1).
 
@@ -26,165 +23,160 @@ import fileinput    # Unused; possibly vestigial
 # Comment: X is Euler characteristic; N0, N1SL, N1TL, N2SL, N2TL, N22, N31 are simplex counts.
 
 def prepare_vertex_array_sphere(T):  # Vertex array for genus 0 (sphere, S^2)
-    start = 0
-    V = []
-    for t in range(T):  # T slices
-        v = np.arange(start, start + 5, 1)  # 5 vertices per slice
-        start = max(v) + 1
-        V.append(v)
-    vertex = np.zeros(T * 5)  # Total vertices
-    for t in range(T):
-        for item in V[t]:
-            vertex[item] = t  # Assign time slice
+    vertex = np.repeat(np.arange(T, dtype=np.int32), 5)  # 5 vertices per slice, numbered slice by slice
     return vertex  # Comment: Returns vertex times for S^1 x S^2 topology (Sec. 2.3).
 
 def prepare_vertex_array(g, T):  # Vertex array for genus g > 0
     V = []
     start = 0
-    v = GetInnerVertices(g, T, start)  # Inner vertices
-    V.append(v)
-    for s in range(1, g):  # Genus segments
-        start = max(v.flatten()) + 1
-        v = GetInnerVertices(g, T, start)
+    for s in range(g):  # Inner vertices of each genus segment
+        v, start = GetInnerVertices(g, T, start)
         V.append(v)
     Missing = GetMissingVertices(g, T)  # Additional vertices
-    missing_max = max(np.concatenate(Missing).flatten()) + 1
+    missing_max = np.concatenate(Missing).max() + 1  # GetMissingVertices is not in this tree, so no closed form
     Corner = GetCornerVertices(g, T, missing_max)  # Corner vertices
-    vertex = np.zeros(1 + max(Corner.flatten()))  # Total vertex array
-    for structure in V:  # Inner vertices
-        for t in range(T):
-            for item in structure[t]:
-                vertex[item] = t
+    vertex = np.zeros(1 + Corner.max(), dtype=np.int32)  # Total vertex array; Corner's extent comes from GetCornerVertices
+    vertex[np.asarray(V)[:, :T]] = np.arange(T)[None, :, None]  # Inner vertices, one scatter for all segments
     if g > 1:  # Multi-genus case
-        for structure in Missing:
-            for t in range(T):
-                for item in structure[t]:
-                    vertex[item] = t
-        for structure in Corner:
-            for t in range(T):
-                for item in structure[t]:
-                    vertex[item] = t
+        ScatterTimes(vertex, list(Missing) + list(Corner), T)
     if g == 1:  # Torus case
-        for t in range(T):
-            for item in Missing[t]:
-                vertex[item] = t
-            for item in Corner[t]:
-                vertex[item] = t
-    return np.asarray(vertex, dtype='int')  # Comment: Assigns time slices (Sec. 3.1).
+        ScatterTimes(vertex, [Missing, Corner], T)
+    return vertex  # Comment: Assigns time slices (Sec. 3.1).
+
+def ScatterTimes(vertex, structures, T):  # vertex[L[t]] = t for every structure L and slice t
+    rows = [np.asarray(L[t], dtype=np.intp).ravel() for L in structures for t in range(T)]  # Slices may differ in length
+    times = np.repeat(np.tile(np.arange(T), len(structures)), [len(r) for r in rows])
+    vertex[np.concatenate(rows)] = times  # One scatter for the whole group
+
+def RowKeys(rows):  # One packed structured scalar per row, so rows sort and compare as single keys
+    rows = np.ascontiguousarray(rows)
+    return rows.view([('', rows.dtype)] * rows.shape[1]).ravel()
+
+def GetFaces(list3):  # All 4N tetrahedron faces, vertex-sorted, tetra-major
+    tris = np.stack([list3[:, [0, 1, 2]], list3[:, [0, 1, 3]], list3[:, [0, 2, 3]], list3[:, [1, 2, 3]]], axis=1).reshape(-1, 3)
+    tris.sort(axis=1)
+    return tris  # Comment: Face 4*i + k of tetra i omits vertex 3 - k.
+
+def BuildAdjacency(list3, tris=None):  # Neighbor table and per-face tetra counts from one sort of the faces
+    if tris is None:
+        tris = GetFaces(list3)
+    keys = RowKeys(tris)  # One sortable key per face
+    order = np.argsort(keys)
+    keys = keys[order]
+    starts = np.r_[0, np.flatnonzero(keys[1:] != keys[:-1]) + 1]
+    counts = np.diff(np.r_[starts, len(tris)])  # Tetrahedra sharing each distinct face
+    TR = np.empty(len(tris), dtype=counts.dtype)
+    TR[order] = np.repeat(counts, counts)  # Count back in face order
+    f0 = order[starts[counts == 2]]  # The two faces of every shared triangle
+    f1 = order[starts[counts == 2] + 1]
+    nbr = np.full((len(list3), 4), -1, dtype=np.int32)
+    nbr[f0 // 4, 3 - f0 % 4] = f1 // 4  # Face 4*i + k lies opposite vertex 3 - k
+    nbr[f1 // 4, 3 - f1 % 4] = f0 // 4
+    return nbr, TR  # Comment: Neighbor j is opposite vertex j, as read by Universe::initialize (Sec. 3.1).
+
+def FindPairs(list3):  # Neighboring tetrahedra of every tetrahedron
+    return BuildAdjacency(list3)[0]
 
 def FindTrianglePairs(list_):  # Finds tetrahedron pairs sharing triangles
-    pairs = []
-    for i in range(len(list_)):
-        p0, p1, p2, p3 = list_[i]
-        lista0 = np.argwhere(list_.T == p0).T[1]
-        lista1 = np.argwhere(list_.T == p1).T[1]
-        lista2 = np.argwhere(list_.T == p2).T[1]
-        ov01 = list(set(lista0).intersection(lista1))
-        ov12 = list(set(lista1).intersection(lista2))
-        triangle = list(set(ov01).intersection(ov12))
-        pairs.append(triangle)
-    return np.asarray(pairs)  # Comment: Identifies neighbor tetrahedra (Sec. 3.2).
+    i = np.arange(len(list_), dtype=np.int32)
+    j = BuildAdjacency(list_)[0][:, 3]  # Face (p0, p1, p2) lies opposite vertex 3
+    lo = np.where(j < 0, i, np.minimum(i, j))  # Unpaired face: keep i first, -1 second
+    hi = np.where(j < 0, -1, np.maximum(i, j))
+    return np.stack([lo, hi], axis=1)  # Comment: Row i is the sorted pair sharing face (p0, p1, p2), or (i, -1) if unpaired (Sec. 3.2).
 
 def getTrianglelList(list3):  # Extracts unique triangles from tetrahedra
-    list2 = []
-    for simp in list3:
-        t1 = list(np.sort([simp[0], simp[1], simp[2]]))
-        t2 = list(np.sort([simp[0], simp[1], simp[3]]))
-        t3 = list(np.sort([simp[0], simp[2], simp[3]]))
-        t4 = list(np.sort([simp[1], simp[2], simp[3]]))
-        for t in [t1, t2, t3, t4]:
-            if t not in list2:
-                list2.append(t)
-    return np.asarray(list2)  # Comment: Builds triangle list (Sec. 3.2).
-
-def getLinklList(list2):  // Extracts unique links (edges) from triangles
-    list1 = []
-    for tria in list2:
-        for el in [[tria[0], tria[1]], [tria[0], tria[2]], [tria[1], tria[2]]]:
-            if el not in list1:
-                list1.append(el)
-    return np.asarray(list1)  # Comment: Builds edge list (Sec. 3.2).
+    return np.unique(GetFaces(list3), axis=0)  # Comment: Builds triangle list (Sec. 3.2).
+
+def getLinklList(list2):  # Extracts unique links (edges) from triangles
+    edges = np.stack([list2[:, [0, 1]], list2[:, [0, 2]], list2[:, [1, 2]]], axis=1).reshape(-1, 2)
+    edges.sort(axis=1)
+    return np.unique(edges, axis=0)  # Comment: Builds edge list (Sec. 3.2).
 
 def PrepDat(vertexlist, simplexlist, list_):  # Prepares output data
-    dat = [len(vertexlist)]  # Number of vertices
-    dat.extend(vertexlist)   # Vertex times
-    dat.append(len(vertexlist))  # Vertex count check
-    dat.append(len(simplexlist))  # Number of tetrahedra
-    for i in range(len(simplexlist)):
-        dat.extend(list_[i])     # Tetrahedron vertices
-        dat.extend(simplexlist[i])  # Neighbor indices
-    dat.append(len(simplexlist))  # Tetra count check
-    return np.asarray(dat)  # Comment: Formats for CDT file (Sec. 3.1).
-
-# Block generation functions for tetrahedra (Sec. 3.2)
+    n0, n3 = len(vertexlist), len(simplexlist)
+    dat = np.empty(n0 + 4 + 8 * n3, dtype=np.int32)  # Filled in place, no int64 or hstack temporaries
+    dat[0] = n0                       # Number of vertices
+    dat[1:n0 + 1] = vertexlist        # Vertex times
+    dat[n0 + 1] = n0                  # Vertex count check
+    dat[n0 + 2] = n3                  # Number of tetrahedra
+    body = dat[n0 + 3:-1].reshape(n3, 8)
+    body[:, :4] = list_               # Tetrahedron vertices
+    body[:, 4:] = simplexlist         # Neighbor indices
+    dat[-1] = n3                      # Tetra count check
+    return dat  # Comment: Formats for CDT file (Sec. 3.1).
+
+# Block generation functions for tetrahedra (Sec. 3.2); vertex indices are int32 throughout
 def GetBlocks_up_left(a, b, c, d, e, f):
-    return np.asarray([a, b, c, e]), np.asarray([a, c, d, e]), np.asarray([a, d, e, f])
+    return np.asarray([a, b, c, e], dtype=np.int32), np.asarray([a, c, d, e], dtype=np.int32), np.asarray([a, d, e, f], dtype=np.int32)
 
 def GetBlocks_up_right(a, b, c, d, e, f):
-    return np.asarray([a, b, c, d]), np.asarray([b, c, d, f]), np.asarray([b, d, e, f])
+    return np.asarray([a, b, c, d], dtype=np.int32), np.asarray([b, c, d, f], dtype=np.int32), np.asarray([b, d, e, f], dtype=np.int32)
 
 def GetBlocks_down_left(a, b, c, d, e, f):
-    return np.asarray([a, b, c, e]), np.asarray([a, c, e, f]), np.asarray([a, d, e, f])
+    return np.asarray([a, b, c, e], dtype=np.int32), np.asarray([a, c, e, f], dtype=np.int32), np.asarray([a, d, e, f], dtype=np.int32)
 
 def GetBlocks_down_right(a, b, c, d, e, f):
-    return np.asarray([a, b, c, f]), np.asarray([a, b, e, f]), np.asarray([a, d, e, f])
+    return np.asarray([a, b, c, f], dtype=np.int32), np.asarray([a, b, e, f], dtype=np.int32), np.asarray([a, d, e, f], dtype=np.int32)
 
 def GetTR(list3):  # Validates tetrahedron triangulation
-    TR, bad_tetra = [], []
-    for i, tetra in enumerate(list3):
-        triangles = [
-            np.asarray([tetra[0], tetra[1], tetra[2]]),
-            np.asarray([tetra[0], tetra[1], tetra[3]]),
-            np.asarray([tetra[0], tetra[2], tetra[3]]),
-            np.asarray([tetra[1], tetra[2], tetra[3]])
-        ]
-        for tri in triangles:
-            p1 = np.argwhere(list3.T == tri[0]).T[1]
-            p2 = np.argwhere(list3.T == tri[1]).T[1]
-            p3 = np.argwhere(list3.T == tri[2]).T[1]
-            int12 = list(set(p1).intersection(p2))
-            int13 = list(set(p1).intersection(p3))
-            TR.append(len(list(set(int12).intersection(int13))))
-            if len(list(set(int12).intersection(int13))) != 2:
-                bad_tetra.append(np.asarray([i, tri, len(list(set(int12).intersection(int13)))]))
-    not2 = [i for i, tr in enumerate(TR) if tr != 2]
-    return np.asarray(not2), np.asarray(bad_tetra)  # Comment: Checks each face has 2 tetrahedra.
+    tris = GetFaces(list3)
+    TR = BuildAdjacency(list3, tris)[1]  # Shares the face table instead of rebuilding it
+    not2 = np.flatnonzero(TR != 2)
+    bad_tetra = [np.asarray([f // 4, tris[f], TR[f]], dtype=object) for f in not2]
+    return not2, np.asarray(bad_tetra)  # Comment: Checks each face has 2 tetrahedra.
 
+@functools.lru_cache(maxsize=None)  # GenCenter and prepare_vertex_array ask for the same segments
 def GetInnerVertices(g, T, start):  # Inner vertices for genus g
-    V = []
-    prev_max = start
-    for t in range(T):
-        v_cur = np.arange(prev_max, prev_max + 12, 1)  # 12 vertices per slice
-        prev_max = max(v_cur) + 1
-        V.append(v_cur)
-    V.append(np.arange(start, start + 12, 1))  # Wrap around
-    return np.asarray(V)  # Comment: Core structure vertices (Sec. 3.1).
-
-def GenCenter(g, T):  # Generates central tetrahedra
+    v = np.arange(start, start + 12 * T, dtype=np.int32).reshape(T, 12)  # 12 vertices per slice
+    V = np.vstack([v, v[:1]])  # Wrap around
+    V.flags.writeable = False  # Cached and shared between callers
+    return V, start + 12 * T  # Comment: Core structure vertices and next free index (Sec. 3.1).
+
+def GenCenter(g, T, out=None):  # Generates central tetrahedra, optionally written into out
+    n = T * len(PATTERN)  # Tetrahedra per segment
+    Simps = np.empty((g * n, 4), dtype=np.int32) if out is None else out  # Preallocated tetra list
     start = 0
-    Simps = [GenInnerStructure(GetInnerVertices(g, T, start))]
-    for s in range(1, g):
-        start = max(Simps[-1].flatten()) + 1
-        Simps.append(GenInnerStructure(GetInnerVertices(g, T, start)))
-    Simps = np.asarray(Simps).reshape(-1, 4)  # Flatten to tetra list
+    for s in range(g):
+        v, start = GetInnerVertices(g, T, start)
+        GenInnerStructure(v, out=Simps[s * n:(s + 1) * n])
     return Simps  # Comment: Central structure for genus g (Sec. 3.1).
 
-def GenInnerStructure(v):  # Inner tetrahedra for one segment
-    Simps = []
-    for t in range(T):
-        vv, vv_2 = v[t], v[t + 1]
-        a0, a1, a2, a3, a4, a5, a6, a7, a8, a9, a10, a11 = vv
-        a0_2, a1_2, a2_2, a3_2, a4_2, a5_2, a6_2, a7_2, a8_2, a9_2, a10_2, a11_2 = vv_2
-        for s in [
-            GetBlocks_up_right(a4, a0, a1, a4_2, a0_2, a1_2),
-            GetBlocks_up_right(a5, a1, a2, a5_2, a1_2, a2_2),
-            # ... (additional calls omitted for brevity)
-            GetBlocks_down_right(a3, a10, a11, a3_2, a10_2, a11_2)
-        ]:
-            Simps.extend(s)
-    return np.asarray(Simps)  # Comment: Generates tetrahedra blocks (Sec. 3.1).
-
-# Additional functions (GetInnerOuters, GetVsingle, GetV0, GetVmid, GetVlast, GetCornerVertices, GetMissingVertices, GenMissing, GenSphere, FindPairs) omitted for brevity but follow similar structure: generate vertices or tetrahedra for specific topology parts.
+# Block templates: the 3 tetrahedra of each GetBlocks_* function as positions in (a, b, c, d, e, f)
+UP_LEFT = [[0, 1, 2, 4], [0, 2, 3, 4], [0, 3, 4, 5]]
+UP_RIGHT = [[0, 1, 2, 3], [1, 2, 3, 5], [1, 3, 4, 5]]
+DOWN_LEFT = [[0, 1, 2, 4], [0, 2, 4, 5], [0, 3, 4, 5]]
+DOWN_RIGHT = [[0, 1, 2, 5], [0, 1, 4, 5], [0, 3, 4, 5]]
+
+# Blocks of one slab as (template, slots); slots 0..11 are slice t, 12..23 are slice t + 1
+INNER_BLOCKS = [
+    (UP_RIGHT, (4, 0, 1, 16, 12, 13)),
+    (UP_RIGHT, (5, 1, 2, 17, 13, 14)),
+    # ... (additional blocks omitted for brevity)
+    (DOWN_RIGHT, (3, 10, 11, 15, 22, 23))
+]
+PATTERN = np.asarray([[slots[k] for k in tet] for tmpl, slots in INNER_BLOCKS for tet in tmpl], dtype=np.int8)
+
+NUMBA_MIN_SLABS = 100000  # Below this np.take matches the Numba kernel and skips its import/JIT cost
+
+def GenInnerStructure(v, out=None):  # Inner tetrahedra for one segment, optionally written into out
+    if out is None:
+        out = np.empty(((len(v) - 1) * len(PATTERN), 4), dtype=v.dtype)
+    if gen_inner is not None and v.dtype == out.dtype == np.int32 and v.flags.c_contiguous and out.flags.c_contiguous:
+        gen_inner(v, PATTERN, out)  # Typed kernel takes C-contiguous int32 only; anything else uses np.take
+        return out
+    if len(v) - 1 >= NUMBA_MIN_SLABS:
+        try:
+            from _cdt_numba import gather_slabs  # Optional; imported only when it can pay for itself
+        except ImportError:
+            pass
+        else:
+            gather_slabs(v, PATTERN, out)
+            return out
+    vv_full = np.concatenate([v[:-1], v[1:]], axis=1)  # (T, 24): slice t next to slice t + 1
+    np.take(vv_full, PATTERN, axis=1, out=out.reshape(len(vv_full), len(PATTERN), 4), mode='clip')
+    return out  # Comment: Generates tetrahedra blocks (Sec. 3.1).
+
+# Additional functions (GetInnerOuters, GetVsingle, GetV0, GetVmid, GetVlast, GetCornerVertices, GetMissingVertices, GenMissing, GenSphere) omitted for brevity but follow similar structure: generate vertices or tetrahedra for specific topology parts.
 
 g = int(sys.argv[1])  # Genus (0 for sphere, >0 for higher genus)
 T = int(sys.argv[2])  # Number of time slices
@@ -192,24 +184,35 @@ T = int(sys.argv[2])  # Number of time slices
 if g == 0:
     list3 = GenSphere(T)  # Sphere topology (S^1 x S^2)
 else:
-    S_center = GenCenter(g, T)  # Central tetrahedra
     S_missing = GenMissing(g, T)  # Boundary tetrahedra
-    list3 = np.vstack((S_center, S_missing))  # Combine
-
-Simplex_list = FindPairs(list3)  # Neighboring tetrahedra pairs
-num0 = max(list3.flatten()) + 1  # Total vertex count
+    n_center = g * T * len(PATTERN)  # Central tetrahedra, known from the pattern table
+    list3 = np.empty((n_center + len(S_missing), 4), dtype=np.int32)  # Combined tetra list
+    GenCenter(g, T, out=list3[:n_center])  # Central tetrahedra written in place
+    list3[n_center:] = S_missing
+    del S_missing
+
+Simplex_list, TR = BuildAdjacency(list3)  # Neighboring tetrahedra pairs and face check in one pass
+bad_faces = np.flatnonzero(TR != 2)  # Every triangle must be shared by exactly two tetrahedra
+for f in bad_faces:
+    sys.stderr.write("bad face {} of tetra {}: shared by {} tetrahedra\n".format(f % 4, f // 4, TR[f]))
+if len(bad_faces):
+    sys.exit(1)  # Unpaired faces leave -1 neighbors, which Universe::initialize cannot load
+del TR, bad_faces
+num0 = list3.max() + 1  # Total vertex count
 
 if g > 0:
     vertex = prepare_vertex_array(g, T)  # Higher genus vertex times
+    GetInnerVertices.cache_clear()  # Segment tables are not needed past this point
 else:
     vertex = prepare_vertex_array_sphere(T)  # Sphere vertex times
 
 dat = PrepDat(vertex, Simplex_list, list3)  # Format output data
+del vertex, Simplex_list, list3  # dat alone stays alive through the chunked write below
 
 outfile = sys.argv[3]  # Output file path
 
-with open(outfile, 'w') as file_handler:
-    file_handler.write("0\n")  # Ordered flag (0 = unordered)
-    for item in dat:
-        file_handler.write("{}\n".format(int(item)))  # Write integers
+with open(outfile, 'wb') as file_handler:
+    file_handler.write(b"0\n")  # Ordered flag (0 = unordered)
+    for i in range(0, len(dat), 65536):  # One integer per line, formatted in fixed-size chunks to bound memory
+        file_handler.write("\n".join(map(str, dat[i:i + 65536].tolist())).encode() + b"\n")
 # Comment: Generates triangulation file for Universe::initialize (Sec. 3.1).
\ No newline at end of file
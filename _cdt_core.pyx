@@ -0,0 +1,19 @@
+# distutils: extra_compile_args=-fopenmp
+# distutils: extra_link_args=-fopenmp
+# cython: language_level=3, boundscheck=False, wraparound=False
+# Compiled block emission for 3dcdt_gen_init.py; build in place with: cythonize -i _cdt_core.pyx
+from cython.parallel import prange
+
+def gen_inner(const int[:, ::1] v, const signed char[:, ::1] pattern, int[:, ::1] out):
+    # Slab t (slices t and t + 1 of v) fills rows t*P .. t*P + P - 1 of out, so slabs run in parallel
+    cdef Py_ssize_t T = v.shape[0] - 1, P = pattern.shape[0], t, p, k
+    cdef int slot
+    with nogil:
+        for t in prange(T):
+            for p in range(P):
+                for k in range(4):
+                    slot = pattern[p, k]
+                    if slot < 12:
+                        out[t * P + p, k] = v[t, slot]
+                    else:
+                        out[t * P + p, k] = v[t + 1, slot - 12]
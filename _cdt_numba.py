@@ -0,0 +1,12 @@
+# Numba kernel for 3dcdt_gen_init.py; imported lazily, only for segments large enough to pay for the JIT
+from numba import njit, prange
+
+
+@njit(parallel=True, cache=True)
+def gather_slabs(v, pattern, out):  # Each slab t fills its own rows of out, so slabs run in parallel
+    P = pattern.shape[0]
+    for t in prange(v.shape[0] - 1):
+        for p in range(P):
+            for k in range(4):
+                slot = pattern[p, k]
+                out[t * P + p, k] = v[t, slot] if slot < 12 else v[t + 1, slot - 12]